@@ -5,7 +5,7 @@
 Compare URL path structures between two websites by crawling their sitemaps.
 
 Features
-- Recursively resolves <sitemapindex> → child sitemaps
+- Recursively resolves <sitemapindex> → child sitemaps (fetched concurrently)
 - Handles .xml and .xml.gz
 - Extracts all <loc> URLs and converts to normalized pathnames
 - Compares sets and writes an Excel report
@@ -15,37 +15,437 @@ Usage:
 """
 
 import argparse
+import asyncio
+import functools
 import gzip
+import hashlib
+import importlib.util
 import io
+import json
+import os
+import re
 import sys
-from typing import Iterable, Set, Tuple, List
-from urllib.parse import urlparse, urlunparse
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Any, BinaryIO, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
+from urllib.parse import urlparse, urlsplit, urlunparse, uses_params
 
 import requests
-import xml.etree.ElementTree as ET
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
 
+try:
+    from lxml import etree
+    HAVE_LXML = True
+except ImportError:
+    # Degrade to the stdlib parser; same iterparse API, minus tag filtering
+    import xml.etree.ElementTree as etree
+    HAVE_LXML = False
+
+try:
+    import aiohttp
+except ImportError:
+    # Only needed for --async
+    aiohttp = None
+
+try:
+    import httpx
+except ImportError:
+    # Only needed for --http2
+    httpx = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    # Only needed for --format xlsx
+    xlsxwriter = None
+
+try:
+    import numba
+except ImportError:
+    # normalize_paths() falls back to pandas string kernels
+    numba = None
+
 DEFAULT_TIMEOUT = 30
+MAX_WORKERS = 16
+ASYNC_CONCURRENCY = 64
+PROGRESS_INTERVAL = 1.0
+READ_BUFFER_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "sitemap-compare",
+)
+# Cached sitemaps not requested for this many seconds are dropped
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Media extensions at the end of the URL path (before any ;params/query/fragment)
+_MEDIA_RE = re.compile(
+    r"^[^?#]*\.(?:jpe?g|png|gif|bmp|svg|webp|mp[34]|avi|mov|wmv|flv|mkv|ogg|wav|flac|aac|webm)(?:;[^/?#]*)?(?:[?#]|$)",
+    re.IGNORECASE,
+)
+
+# Below this many URLs the per-URL loop beats the pandas round-trip
+VECTORIZE_MIN_URLS = 5_000
+# The JIT kernel only pays off (load/compile time) from this many URLs
+NUMBA_MIN_URLS = 100_000
+
+# Regex fast path for plain sitemaps: unprefixed <loc> elements, optionally CDATA-wrapped
+_LOC_RE = re.compile(rb"<loc>\s*(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))\s*</loc>", re.DOTALL)
+_LOC_END = b"</loc>"
+_COMMENT_START = b"<!--"
+_COMMENT_END = b"-->"
+_ROOT_END_RE = re.compile(rb"</(?:urlset|sitemapindex)\s*>")
+_ROOT_RE = re.compile(rb"<(urlset|sitemapindex)[\s>]")
+_ENCODING_RE = re.compile(rb"""<\?xml[^>]*encoding=["']([A-Za-z0-9._-]+)""")
+_XML_ENTITY_RE = re.compile(r"&(?:#[xX]([0-9a-fA-F]+)|#([0-9]+)|(amp|lt|gt|quot|apos));")
+_XML_ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+# How much of the body is inspected to decide between the regex and XML parsers
+SNIFF_SIZE = 4096
+
+if HAVE_LXML:
+    # <loc> of each <url>/<sitemap>, in any namespace; nested <image:loc> etc. are skipped
+    _LOC_XPATH = etree.XPath("/*/*/*[local-name()='loc']")
+
+# URL scheme characters, as accepted by urlparse
+_SCHEME_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*")
+# Cleaned up by urlsplit before parsing: leading C0 controls/spaces, then tab/CR/LF anywhere
+_URL_LEADING_JUNK = "".join(map(chr, range(0x21)))
+_URL_UNSAFE_PATTERN = r"[\t\r\n]"
+_URL_UNSAFE_TABLE = str.maketrans("", "", "\t\r\n")
+# Schemes whose last path segment may carry ;params that urlparse splits off
+_PARAMS_SCHEMES = frozenset(uses_params)
+
+# (scheme, path, query) split the way urlparse does it; the fragment is dropped
+_URL_PARTS_PATTERN = r"^[\x00- ]*(?:([A-Za-z][A-Za-z0-9+.-]*):)?(?://[^/?#]*)?([^?#]*)(?:\?([^#]*))?"
+# ;params of the last path segment: from its first ';' to the end
+_PARAMS_PATTERN = r";[^/]*$"
+
+# Rows per worksheet in .xlsx, header row included
+EXCEL_MAX_ROWS = 1_048_576
+
 HEADERS = {
     "User-Agent": "SitemapPathComparator/1.0 (+https://example.com)"
 }
 
 
-def fetch_bytes(url: str) -> bytes:
-    """Fetch bytes from URL, auto-decompress if .gz or gzip content."""
-    resp = requests.get(url, headers=HEADERS, timeout=DEFAULT_TIMEOUT)
-    resp.raise_for_status()
-    content = resp.content
+def build_session() -> requests.Session:
+    """Create a Session whose connection pool is shared by all fetch workers."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = build_session()
+# Set by enable_http2(); when present, threaded fetches go through it instead of SESSION
+HTTP2_CLIENT = None
+
+
+def build_http2_client() -> "httpx.Client":
+    """Create an httpx Client that multiplexes concurrent fetches over HTTP/2."""
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=MAX_WORKERS),
+    )
+    return httpx.Client(
+        transport=transport,
+        headers=HEADERS,
+        timeout=DEFAULT_TIMEOUT,
+        follow_redirects=True,
+    )
+
+
+def enable_http2() -> None:
+    """Route threaded fetches through a shared HTTP/2 client (needs httpx[http2])."""
+    global HTTP2_CLIENT
+    HTTP2_CLIENT = build_http2_client()
+
+
+class SitemapCache:
+    """
+    On-disk copy of every sitemap body, revalidated with conditional GETs.
+
+    index.json maps URL -> {"etag", "last_modified", "path", "used"}; bodies
+    are stored gzip-compressed (level 1). A 304 reply replays the stored body
+    instead of downloading it again. Only responses carrying an ETag or
+    Last-Modified header are cached, since nothing else can be revalidated.
+
+    Index changes stay in memory until flush(), which the walkers call once
+    per sitemap tree; it also expires entries unused for CACHE_MAX_AGE.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+        self.enabled = True
+        self._index_path = os.path.join(directory, "index.json")
+        self._index = None
+        # URL -> entry added or used since the last flush()
+        self._touched = {}
+        self._lock = Lock()
+
+    def _entries(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self._index_path, encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".gz")
+
+    def conditional_headers(self, url: str) -> dict:
+        """Request headers that let the server answer 304 for a cached `url`."""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            entry = self._entries().get(url)
+            if entry:
+                self._touched[url] = entry = dict(entry, used=time.time())
+        if not entry or not os.path.exists(entry["path"]):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
 
-    # If URL ends with .gz or server returns gzip content, try decompress
-    is_gz = url.lower().endswith(".gz") or resp.headers.get("Content-Encoding", "").lower() == "gzip"
-    if is_gz:
+    def open_body(self, url: str) -> BinaryIO:
+        """Open the cached body of `url` (after a 304)."""
+        with self._lock:
+            path = self._entries()[url]["path"]
+        return gzip.open(path, "rb")
+
+    def writer(self, url: str, headers: Mapping[str, str]) -> Optional["_CacheWriter"]:
+        """Start caching a fresh response body, or None if it can't be revalidated."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not self.enabled or not (etag or last_modified):
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            return _CacheWriter(self, url, {"etag": etag, "last_modified": last_modified})
+        except OSError as e:
+            self.disable(e)
+            return None
+
+    def disable(self, error: OSError) -> None:
+        """Stop caching after a disk error; fetching and parsing carry on uncached."""
+        if self.enabled:
+            print(f"[WARN] Sitemap cache disabled: {error}", file=sys.stderr)
+        self.enabled = False
+
+    def _store(self, url: str, entry: dict) -> None:
+        with self._lock:
+            entry["used"] = time.time()
+            self._entries()[url] = self._touched[url] = entry
+
+    def flush(self) -> None:
+        """Merge this run's entries into index.json and drop expired ones with their bodies."""
+        with self._lock:
+            if not self._touched:
+                return
+            # Re-read so entries written by a concurrent run aren't lost
+            self._index = None
+            index = self._entries()
+            index.update(self._touched)
+            self._touched = {}
+
+            now = time.time()
+            for url, entry in list(index.items()):
+                # Entries from before "used" was tracked start their clock now
+                if now - entry.setdefault("used", now) > CACHE_MAX_AGE or not os.path.exists(entry["path"]):
+                    del index[url]
+                    try:
+                        os.remove(entry["path"])
+                    except OSError:
+                        pass
+
+            try:
+                fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp, self._index_path)
+            except OSError as e:
+                print(f"[WARN] Could not write the sitemap cache index: {e}", file=sys.stderr)
+
+
+class _CacheWriter:
+    """
+    Spools one body into the cache; nothing is visible until commit(). Disk
+    errors disable the cache instead of failing the fetch.
+    """
+
+    def __init__(self, cache: SitemapCache, url: str, entry: dict):
+        self._cache = cache
+        self._url = url
+        self._entry = entry
+        fd, self._tmp = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        os.close(fd)
+        self._file = gzip.open(self._tmp, "wb", compresslevel=1)
+        self._done = False
+
+    def write(self, data: bytes) -> None:
+        if self._done:
+            return
+        try:
+            self._file.write(data)
+        except OSError as e:
+            self._fail(e)
+
+    def commit(self) -> None:
+        if self._done:
+            return
+        try:
+            self._file.close()
+            path = self._cache._body_path(self._url)
+            os.replace(self._tmp, path)
+        except OSError as e:
+            self._fail(e)
+            return
+        self._cache._store(self._url, dict(self._entry, path=path))
+        self._done = True
+
+    def discard(self) -> None:
+        if self._done:
+            return
+        try:
+            self._file.close()
+        except OSError:
+            pass
         try:
-            return gzip.decompress(content)
+            os.remove(self._tmp)
         except OSError:
-            # Not actually gzipped; fall through
             pass
-    return content
+        self._done = True
+
+    def _fail(self, error: OSError) -> None:
+        self._cache.disable(error)
+        self.discard()
+
+
+CACHE = SitemapCache()
+
+
+class _TeeReader(io.RawIOBase):
+    """Raw stream that copies everything read from `source` into `sink`."""
+
+    def __init__(self, source: BinaryIO, sink: _CacheWriter):
+        self._source = source
+        self._sink = sink
+        self.at_eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._source.readinto(b)
+        if n:
+            self._sink.write(memoryview(b)[:n])
+        else:
+            self.at_eof = True
+        return n
+
+
+class _IterStream(io.RawIOBase):
+    """Raw stream over an iterator of byte chunks (httpx response bodies)."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+@contextmanager
+def _http_get(url: str, headers: Mapping[str, str]) -> Iterator[Tuple[int, Mapping[str, str], BinaryIO, str]]:
+    """
+    Stream a GET through HTTP2_CLIENT or SESSION. Yields (status, headers,
+    raw body, final URL after redirects) with Content-Encoding already
+    undone; 304 is not an error.
+    """
+    if HTTP2_CLIENT is not None:
+        with HTTP2_CLIENT.stream("GET", url, headers=headers) as resp:
+            if resp.status_code != 304:
+                resp.raise_for_status()
+            yield resp.status_code, resp.headers, _IterStream(resp.iter_bytes()), str(resp.url)
+        return
+
+    resp = SESSION.get(url, headers=headers, timeout=DEFAULT_TIMEOUT, stream=True)
+    try:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        # Keep urllib3 from reporting "closed" at EOF while io wrappers still read
+        resp.raw.auto_close = False
+        yield resp.status_code, resp.headers, resp.raw, resp.url
+    finally:
+        resp.close()
+
+
+def _gunzip_if_needed(stream: io.BufferedReader) -> BinaryIO:
+    """Wrap `stream` in a GzipFile when it starts with the gzip magic bytes."""
+    if stream.peek(len(GZIP_MAGIC)).startswith(GZIP_MAGIC):
+        return io.BufferedReader(gzip.GzipFile(fileobj=stream, mode="rb"), READ_BUFFER_SIZE)
+    return stream
+
+
+@contextmanager
+def open_sitemap(url: str) -> Iterator[Tuple[BinaryIO, str]]:
+    """
+    Open a streaming, decompressed view of the body at `url`. Yields
+    (stream, final URL after redirects).
+
+    Content-Encoding: gzip is inflated by the HTTP client while reading;
+    gzipped files (.xml.gz) are detected by their magic bytes and wrapped in
+    a GzipFile. Bodies are revalidated against / saved into the on-disk CACHE.
+    """
+    cache_headers = CACHE.conditional_headers(url)
+    writer = None
+    with _http_get(url, cache_headers) as (status, headers, raw, final_url):
+        try:
+            if status == 304 and cache_headers:
+                # Unchanged since the last run: replay the cached body
+                with CACHE.open_body(url) as body:
+                    yield _gunzip_if_needed(body), final_url
+                return
+
+            writer = CACHE.writer(url, headers)
+            if writer is not None:
+                raw = tee = _TeeReader(raw, writer)
+            yield _gunzip_if_needed(io.BufferedReader(raw, READ_BUFFER_SIZE)), final_url
+            if writer is not None and tee.at_eof:
+                writer.commit()
+        finally:
+            if writer is not None:
+                writer.discard()
 
 
 def strip_ns(tag: str) -> str:
@@ -55,23 +455,311 @@ def strip_ns(tag: str) -> str:
     return tag
 
 
-def parse_sitemap_xml(xml_bytes: bytes) -> ET.Element:
-    return ET.fromstring(xml_bytes)
+def _collect_locs(
+    events: Iterable[Tuple[str, Any]], locs: List[str], depth: int = 0
+) -> Tuple[Optional[Any], int]:
+    """
+    Append <loc> text from ElementTree ("start"/"end", element) pairs to
+    `locs`, clearing elements once read. Like _LOC_XPATH, only <loc> at
+    <urlset>/<url>/<loc> depth counts. Returns (last element ended, depth
+    to resume from on the next batch of events).
+    """
+    last = None
+    for event, elem in events:
+        if event == "start":
+            depth += 1
+            continue
+        if depth > 3:
+            # Inside a <loc> (or a sibling): read and cleared along with it
+            depth -= 1
+            continue
+        if depth == 3 and strip_ns(elem.tag).lower() == "loc":
+            text = "".join(elem.itertext()).strip()
+            if text:
+                locs.append(sys.intern(text))
+        depth -= 1
+        elem.clear()
+        last = elem
+    return last, depth
+
+
+def _dom_locs(root: Any) -> Tuple[str, List[str]]:
+    """(lowercased root tag, <loc> values) of an lxml document, via one _LOC_XPATH call."""
+    locs = []
+    for loc in _LOC_XPATH(root):
+        # A comment inside <loc> splits its text: join the pieces around it
+        text = ("".join(loc.itertext()) if len(loc) else loc.text or "").strip()
+        if text:
+            locs.append(sys.intern(text))
+    return etree.QName(root).localname.lower(), locs
+
+
+def _sniff_root_tag(head: bytes) -> str:
+    """
+    Return the root tag if the start of the body shows a plain UTF-8 sitemap
+    that _LocScanner can handle, else "" (use the XML parser).
+    """
+    decl = _ENCODING_RE.search(head)
+    if decl and decl.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        return ""
+    m = _ROOT_RE.search(head)
+    return m.group(1).decode("ascii") if m else ""
+
+
+def _xml_unescape(match: "re.Match[str]") -> str:
+    hex_ref, dec_ref, name = match.groups()
+    if name:
+        return _XML_ENTITIES[name]
+    return chr(int(hex_ref, 16) if hex_ref else int(dec_ref))
+
 
+class _RegexFallback(Exception):
+    """Raised by _LocScanner when a body needs the XML parser after all."""
 
-def iter_loc_values(root: ET.Element) -> Iterable[str]:
-    """Yield all text values from <loc> elements anywhere in the tree."""
-    for el in root.iter():
-        if strip_ns(el.tag).lower() == "loc" and el.text:
-            yield el.text.strip()
 
+class _LocScanner:
+    """
+    Regex <loc> extractor for byte chunks. XML comments are dropped first.
+    Each chunk is then scanned up to its last </loc>; the remainder is
+    carried over in case a <loc> straddles two chunks.
+
+    Every "<loc" in the body must be matched by _LOC_RE, and the root must be
+    closed; markup the regex doesn't cover (<loc >, </loc\n>, <loc/>, mixed
+    CDATA, ...) or a truncated body raises _RegexFallback instead of silently
+    skipping URLs.
+    """
+
+    def __init__(self, locs: List[str]):
+        self.locs = locs
+        self._tail = b""
+        self._comment_tail = b""
+        self._in_comment = False
+        self._root_closed = False
+
+    def feed(self, chunk: bytes) -> None:
+        self._scan(self._uncomment(chunk))
+
+    def close(self) -> None:
+        """Scan the bytes held back by _uncomment() and check that nothing is left over."""
+        if self._in_comment:
+            raise _RegexFallback("unterminated comment")
+        self._scan(self._comment_tail)
+        if b"<loc" in self._tail:
+            raise _RegexFallback("<loc> after the last </loc>")
+        if not (self._root_closed or _ROOT_END_RE.search(self._tail)):
+            raise _RegexFallback("root element not closed; body may be truncated")
+
+    def _uncomment(self, chunk: bytes) -> bytes:
+        # Holds back the last few bytes, as a "<!--" or "-->" may straddle chunks
+        buf = self._comment_tail + chunk if self._comment_tail else chunk
+        if not self._in_comment and _COMMENT_START not in buf:
+            # Common case: no comment at all, only a partial "<!--" at the end is kept
+            cut = buf.find(b"<", len(buf) - 3)
+            if cut != -1 and _COMMENT_START.startswith(buf[cut:]):
+                self._comment_tail = buf[cut:]
+                return buf[:cut]
+            self._comment_tail = b""
+            return buf
+        out = []
+        pos = 0
+        while True:
+            if self._in_comment:
+                close = buf.find(_COMMENT_END, pos)
+                if close == -1:
+                    self._comment_tail = buf[max(pos, len(buf) - 2):]
+                    break
+                pos = close + 3
+                self._in_comment = False
+            else:
+                start = buf.find(_COMMENT_START, pos)
+                if start == -1:
+                    cut = max(pos, len(buf) - 3)
+                    out.append(buf[pos:cut])
+                    self._comment_tail = buf[cut:]
+                    break
+                out.append(buf[pos:start])
+                pos = start + 4
+                self._in_comment = True
+        return b"".join(out)
+
+    def _scan(self, chunk: bytes) -> None:
+        buf = self._tail + chunk if self._tail else chunk
+        end = buf.rfind(_LOC_END)
+        if end == -1:
+            if _ROOT_END_RE.search(buf):
+                self._root_closed = True
+            start = buf.rfind(b"<loc")
+            # Otherwise keep enough for a "<loc" or "</sitemapindex>" cut in two
+            self._tail = buf[start:] if start != -1 else buf[-16:]
+            return
+        end += len(_LOC_END)
+
+        matches = _LOC_RE.findall(buf, 0, end)
+        if len(matches) != buf.count(b"<loc", 0, end):
+            raise _RegexFallback("<loc> markup not handled by the regex")
+
+        append = self.locs.append
+        for cdata, text in matches:
+            if cdata:
+                loc = cdata.decode("utf-8").strip()
+            else:
+                loc = text.decode("utf-8").strip()
+                if "&" in loc:
+                    loc = _XML_ENTITY_RE.sub(_xml_unescape, loc)
+            if loc:
+                append(sys.intern(loc))
+        self._tail = buf[end:]
+
+
+def parse_sitemap_stream(source: BinaryIO, fast: bool = True) -> Tuple[str, List[str]]:
+    """
+    Parse a sitemap in a single pass over `source`.
+
+    Plain UTF-8 sitemaps (unprefixed <urlset>/<sitemapindex>) are scanned
+    with a regex over the raw bytes unless `fast` is False; the scan raises
+    _RegexFallback when the body needs a real parser. Anything else is parsed by lxml and
+    queried with _LOC_XPATH (sitemaps are capped at 50MB, so the DOM stays
+    bounded), or stream-parsed with ElementTree's iterparse without lxml.
+    Returns (lowercased root tag, list of <loc> text values).
+    """
+    locs = []
+    root_tag = _sniff_root_tag(source.peek(SNIFF_SIZE)[:SNIFF_SIZE]) if fast else ""
+    if root_tag:
+        scanner = _LocScanner(locs)
+        for chunk in iter(functools.partial(source.read, READ_BUFFER_SIZE), b""):
+            scanner.feed(chunk)
+        scanner.close()
+        return root_tag, locs
+
+    if HAVE_LXML:
+        return _dom_locs(etree.parse(source).getroot())
+
+    context = etree.iterparse(source, events=("start", "end"))
+    _collect_locs(context, locs)
+    return strip_ns(context.root.tag).lower(), locs
+
+
+class SitemapPullParser:
+    """
+    Incremental counterpart of parse_sitemap_stream() for bodies that arrive
+    as chunks (the --async path). Gzipped files are inflated on the fly.
+    """
+
+    def __init__(self, fast: bool = True):
+        self._fast = fast
+        self._inflater = None
+        self._head = b""
+        self._xml_head = b""
+        self._scanner = None
+        self._parser = None
+        self._root_tag = ""
+        self._last = None
+        self._depth = 0
+        self.locs = []
+
+    def feed(self, chunk: bytes) -> None:
+        if self._head is not None:
+            # Wait for enough bytes to sniff the gzip magic
+            self._head += chunk
+            if len(self._head) < len(GZIP_MAGIC):
+                return
+            chunk, self._head = self._head, None
+            if chunk.startswith(GZIP_MAGIC):
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._inflater is not None:
+            chunk = self._inflater.decompress(chunk)
+        self._feed_xml(chunk)
+
+    def close(self) -> Tuple[str, List[str]]:
+        """Finish parsing; returns (lowercased root tag, list of <loc> values)."""
+        if self._head:
+            self._feed_xml(self._head)
+        if self._inflater is not None:
+            self._feed_xml(self._inflater.flush())
+        if self._xml_head is not None:
+            self._start(self._xml_head)
+        if self._scanner is not None:
+            self._scanner.close()
+            return self._root_tag, self.locs
+
+        root = self._parser.close()
+        if HAVE_LXML:
+            return _dom_locs(root)
+        self._read_events()
+        if root is None:
+            # ElementTree's pull parser doesn't return the root; it ends last
+            root = self._last
+        return (strip_ns(root.tag).lower() if root is not None else ""), self.locs
+
+    def _feed_xml(self, data: bytes) -> None:
+        if self._xml_head is not None:
+            # Wait for enough of the document to pick the regex or XML parser
+            self._xml_head += data
+            if len(self._xml_head) >= SNIFF_SIZE:
+                self._start(self._xml_head)
+        elif self._scanner is not None:
+            self._scanner.feed(data)
+        else:
+            self._parser.feed(data)
+            if not HAVE_LXML:
+                self._read_events()
+
+    def _start(self, head: bytes) -> None:
+        self._xml_head = None
+        self._root_tag = _sniff_root_tag(head[:SNIFF_SIZE]) if self._fast else ""
+        if self._root_tag:
+            self._scanner = _LocScanner(self.locs)
+            self._scanner.feed(head)
+        else:
+            if HAVE_LXML:
+                # Feed-built DOM, queried with _LOC_XPATH on close()
+                self._parser = etree.XMLParser()
+                self._parser.feed(head)
+            else:
+                self._parser = etree.XMLPullParser(events=("start", "end"))
+                self._parser.feed(head)
+                self._read_events()
+
+    def _read_events(self) -> None:
+        last, self._depth = _collect_locs(self._parser.read_events(), self.locs, self._depth)
+        if last is not None:
+            self._last = last
+
+
+def split_path_query(url: str) -> Tuple[str, str]:
+    """
+    Return (path, query) of `url` using plain str.find scans.
+
+    Gives the same split as urlparse (leading junk and tab/CR/LF removed,
+    optional scheme, optional //netloc, ;params of the last segment and
+    fragment dropped) without its full RFC 3986 machinery.
+    """
+    url = url.lstrip(_URL_LEADING_JUNK)
+    if "\t" in url or "\r" in url or "\n" in url:
+        url = url.translate(_URL_UNSAFE_TABLE)
+    end = url.find("#")
+    if end == -1:
+        end = len(url)
+    q = url.find("?", 0, end)
+    path_end = end if q == -1 else q
 
-def is_sitemap_index(root: ET.Element) -> bool:
-    return strip_ns(root.tag).lower() == "sitemapindex"
+    start = 0
+    scheme = ""
+    colon = url.find(":", 0, path_end)
+    if colon > 0 and _SCHEME_RE.fullmatch(url, 0, colon):
+        scheme = url[:colon].lower()
+        start = colon + 1
+    if url.startswith("//", start, path_end):
+        slash = url.find("/", start + 2, path_end)
+        start = path_end if slash == -1 else slash
 
+    if scheme in _PARAMS_SCHEMES:
+        # e.g. /page;jsessionid=ABC -> /page
+        semi = url.find(";", max(url.rfind("/", start, path_end), start), path_end)
+        if semi != -1:
+            path_end = semi
 
-def is_urlset(root: ET.Element) -> bool:
-    return strip_ns(root.tag).lower() == "urlset"
+    return url[start:path_end], ("" if q == -1 else url[q + 1:end])
 
 
 def normalize_path(
@@ -79,6 +767,7 @@ def normalize_path(
     keep_trailing_slash: bool = False,
     respect_case: bool = False,
     include_query: bool = False,
+    strict_parse: bool = False,
 ) -> str:
     """
     Convert URL to a comparison key:
@@ -87,16 +776,25 @@ def normalize_path(
       - normalize case (default lower)
       - trim trailing slash (default)
       - treat empty path as "/"
+
+    The URL is split with split_path_query(); pass strict_parse=True to use
+    urlparse instead for pathological inputs.
+
+    Keys are interned so equal keys from both sides compare by identity.
     """
-    parsed = urlparse(url)
+    if strict_parse:
+        parsed = urlparse(url)
+        path, query = parsed.path, parsed.query
+    else:
+        path, query = split_path_query(url)
 
     # Path component
-    path = parsed.path or "/"
+    path = path or "/"
 
     # Optionally include query as part of the key (less common for structural checks)
-    if include_query and parsed.query:
+    if include_query and query:
         # Rebuild with only path+query
-        path = urlunparse(("", "", path, "", parsed.query, ""))
+        path = urlunparse(("", "", path, "", query, "")) if strict_parse else f"{path}?{query}"
 
     # Normalize trailing slash (default: remove unless root '/')
     if not keep_trailing_slash and path != "/":
@@ -106,65 +804,514 @@ def normalize_path(
     if not respect_case:
         path = path.lower()
 
-    return path or "/"
+    return sys.intern(path or "/")
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _normalize_batch(buf, offsets, out, out_lens, lowercase, keep_slash, keep_query, param_schemes, param_scheme_lens):
+        """
+        Byte-level twin of normalize_path() for ASCII URLs packed end to end in
+        `buf`; URL r spans buf[offsets[r]:offsets[r + 1]]. Its key is written to
+        `out` at offsets[r] + r (one spare byte per URL) and its length to out_lens[r].
+        `param_schemes` holds the NUL-padded lowercase schemes that take ;params.
+        """
+        n = offsets.shape[0] - 1
+        for r in numba.prange(n):
+            row = buf[offsets[r]:offsets[r + 1]]
+            # Leading C0 controls and spaces don't count, as in urlsplit
+            lead = 0
+            while lead < row.shape[0] and row[lead] <= 32:
+                lead += 1
+            row = row[lead:]
+            dst = out[offsets[r] + r:offsets[r + 1] + r + 1]
+
+            # Content ends at the fragment
+            end = row.shape[0]
+            for c in range(end):
+                if row[c] == 35:  # '#'
+                    end = c
+                    break
+            path_end = end
+            for c in range(end):
+                if row[c] == 63:  # '?'
+                    path_end = c
+                    break
+
+            # Skip an optional "scheme:" and "//netloc", the same way urlparse does
+            start = 0
+            scheme_len = 0
+            if path_end > 0 and 97 <= (row[0] | 32) <= 122:
+                c = 1
+                while c < path_end and (
+                    97 <= (row[c] | 32) <= 122 or 48 <= row[c] <= 57
+                    or row[c] == 43 or row[c] == 45 or row[c] == 46  # '+', '-', '.'
+                ):
+                    c += 1
+                if c < path_end and row[c] == 58:  # ':'
+                    start = c + 1
+                    scheme_len = c
+            if start + 1 < path_end and row[start] == 47 and row[start + 1] == 47:
+                c = start + 2
+                while c < path_end and row[c] != 47:
+                    c += 1
+                start = c
+
+            # Drop ;params of the last segment, for the same schemes as urlparse
+            strip_params = scheme_len == 0
+            for s in range(param_schemes.shape[0]):
+                if strip_params:
+                    break
+                if param_scheme_lens[s] == scheme_len:
+                    strip_params = True
+                    for c in range(scheme_len):
+                        if (row[c] | 32) != param_schemes[s, c]:
+                            strip_params = False
+                            break
+            path_stop = path_end
+            if strip_params:
+                last_slash = start
+                for c in range(start, path_end):
+                    if row[c] == 47:
+                        last_slash = c
+                for c in range(last_slash, path_end):
+                    if row[c] == 59:  # ';'
+                        path_stop = c
+                        break
+
+            k = 0
+            if start == path_stop:
+                dst[0] = 47
+                k = 1
+            else:
+                for c in range(start, path_stop):
+                    dst[k] = row[c]
+                    k += 1
+            if keep_query and end - path_end > 1:
+                for c in range(path_end, end):
+                    dst[k] = row[c]
+                    k += 1
+
+            if not keep_slash and not (k == 1 and dst[0] == 47):
+                while k > 0 and dst[k - 1] == 47:
+                    k -= 1
+            if lowercase:
+                for c in range(k):
+                    if 65 <= dst[c] <= 90:
+                        dst[c] += 32
+            if k == 0:
+                dst[0] = 47
+                k = 1
+            out_lens[r] = k
+
+
+    _PARAM_SCHEME_ROWS = np.array(sorted(s.encode("ascii") for s in _PARAMS_SCHEMES))
+    _PARAM_SCHEME_LENS = np.array([len(s) for s in _PARAM_SCHEME_ROWS.tolist()], dtype=np.int64)
+
+
+def _normalize_paths_numba(
+    urls: List[str],
+    keep_trailing_slash: bool,
+    respect_case: bool,
+    include_query: bool,
+) -> Optional[np.ndarray]:
+    """Run the JIT kernel over `urls`; None if some URL is non-ASCII."""
+    try:
+        data = "".join(urls).encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    if b"\t" in data or b"\r" in data or b"\n" in data:
+        # Rare enough to drop in Python rather than in the kernel
+        urls = [url.translate(_URL_UNSAFE_TABLE) for url in urls]
+        data = "".join(urls).encode("ascii")
+    # Flat buffer + offsets: memory follows the total length, not the longest URL
+    offsets = np.zeros(len(urls) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, urls), dtype=np.int64, count=len(urls)), out=offsets[1:])
+
+    # One spare byte per URL: an empty path becomes "/"
+    out = np.empty(len(data) + len(urls), dtype=np.uint8)
+    out_lens = np.empty(len(urls), dtype=np.int64)
+    _normalize_batch(
+        np.frombuffer(data, dtype=np.uint8),
+        offsets,
+        out,
+        out_lens,
+        not respect_case,
+        keep_trailing_slash,
+        include_query,
+        _PARAM_SCHEME_ROWS.view(np.uint8).reshape(len(_PARAM_SCHEME_ROWS), -1),
+        _PARAM_SCHEME_LENS,
+    )
+    # Latin-1 maps byte for byte; the unwritten slack between keys is never sliced
+    text = out.tobytes().decode("latin-1")
+    starts = (offsets[:-1] + np.arange(len(urls))).tolist()
+    keys = {text[i:i + k] for i, k in zip(starts, out_lens.tolist())}
+    return np.array([sys.intern(key) for key in sorted(keys)], dtype=object)
+
+
+def normalize_paths(
+    urls: Iterable[str],
+    keep_trailing_slash: bool = False,
+    respect_case: bool = False,
+    include_query: bool = False,
+    strict_parse: bool = False,
+) -> np.ndarray:
+    """
+    Normalize many URLs at once with the same rules as normalize_path().
+    Returns the distinct keys as a sorted object array.
+
+    Very large inputs run through a parallel JIT kernel when Numba is
+    installed, others through pandas string kernels (one regex pass to split
+    path/query, then vectorized lower/rstrip). strict_parse forces the
+    per-URL urlparse path.
+    """
+    urls = list(urls)
+    if strict_parse or len(urls) < VECTORIZE_MIN_URLS:
+        paths = [normalize_path(u, keep_trailing_slash, respect_case, include_query, strict_parse) for u in urls]
+        return np.unique(np.array(paths, dtype=object))
+
+    if numba is not None and len(urls) >= NUMBA_MIN_URLS:
+        paths = _normalize_paths_numba(urls, keep_trailing_slash, respect_case, include_query)
+        if paths is not None:
+            return paths
+
+    # Python storage: pyarrow's lowercasing differs from str.lower() (e.g. final sigma),
+    # and both sides of a comparison must get the same keys whatever backend they hit
+    series = pd.Series(urls, dtype=pd.StringDtype("python"))
+    unsafe = series.str.contains(_URL_UNSAFE_PATTERN, regex=True)
+    if unsafe.any():
+        series = series.mask(unsafe, series.str.replace(_URL_UNSAFE_PATTERN, "", regex=True))
+    parts = series.str.extract(_URL_PARTS_PATTERN, expand=True)
+    path = parts[1].fillna("")
+    with_params = path.str.contains(";", regex=False) & parts[0].fillna("").str.lower().isin(_PARAMS_SCHEMES)
+    if with_params.any():
+        path = path.mask(with_params, path.str.replace(_PARAMS_PATTERN, "", regex=True))
+    path = path.mask(path == "", "/")
+
+    if include_query:
+        query = parts[2].fillna("")
+        path = path.mask(query != "", path + "?" + query)
+
+    if not keep_trailing_slash:
+        path = path.mask(path != "/", path.str.rstrip("/"))
+
+    if not respect_case:
+        path = path.str.lower()
+
+    path = path.mask(path == "", "/")
+    return np.sort(np.array([sys.intern(p) for p in path.unique()], dtype=object))
 
 
 def is_media_url(url: str) -> bool:
     """Check if the URL points to a media file based on its extension."""
-    media_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp',
-                        '.mp4', '.mp3', '.avi', '.mov', '.wmv', '.flv', '.mkv',
-                        '.ogg', '.wav', '.flac', '.aac', '.webm'}
-    parsed = urlparse(url)
-    return any(parsed.path.lower().endswith(ext) for ext in media_extensions)
+    return _MEDIA_RE.search(url) is not None
+
+
+# (lowercased host, path[?query]), or the raw URL when it can't be split
+_SitemapKey = Union[Tuple[str, str], str]
+
+
+def sitemap_key(url: str) -> _SitemapKey:
+    """
+    Visited-set key of a sitemap URL: (lowercased host, path[?query]), both
+    interned. Scheme and fragment are ignored, so http/https twins and host
+    case variants are fetched once. Unparseable URLs are keyed as-is; their
+    fetch then fails with a warning.
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return sys.intern(url)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return sys.intern(parts.netloc.lower()), sys.intern(path)
+
+
+def _claim_final_url(sitemap_url: str, final_url: str, visited: Set[_SitemapKey]) -> bool:
+    """
+    Mark the post-redirect URL of `sitemap_url` as visited. Returns False
+    when it was already visited, i.e. the body need not be read again.
+    """
+    key = sitemap_key(final_url)
+    if key == sitemap_key(sitemap_url):
+        return True
+    if key in visited:
+        return False
+    visited.add(key)
+    return True
+
+
+def _read_sitemap(
+    sitemap_url: str, visited: Set[_SitemapKey], lock: Lock, fast: bool = True
+) -> Optional[Tuple[str, List[str]]]:
+    """Fetch and parse one sitemap; None (after a warning) if that failed or it was already visited."""
+    parsing = False
+    try:
+        with open_sitemap(sitemap_url) as (stream, final_url):
+            if fast:
+                # A fallback re-read has already been claimed
+                with lock:
+                    if not _claim_final_url(sitemap_url, final_url, visited):
+                        return None
+            # Parse errors must leave open_sitemap() as exceptions so the body isn't cached
+            parsing = True
+            return parse_sitemap_stream(stream, fast)
+    except _RegexFallback:
+        raise
+    except Exception as e:
+        what = "parse XML from" if parsing else "fetch"
+        print(f"[WARN] Failed to {what} {sitemap_url}: {e}", file=sys.stderr)
+        return None
+
+
+def expand_sitemap(sitemap_url: str, urls: Set[str], visited: Set[_SitemapKey], lock: Lock) -> List[str]:
+    """
+    Fetch and parse a single sitemap. Page URLs (minus media) are added to
+    `urls` under `lock`; child sitemap URLs of a <sitemapindex> are returned.
+    A redirect to an already visited sitemap is dropped before reading it.
+    """
+    try:
+        parsed = _read_sitemap(sitemap_url, visited, lock)
+    except _RegexFallback:
+        # Markup the regex can't be trusted with: fetch again for the XML parser
+        parsed = _read_sitemap(sitemap_url, visited, lock, fast=False)
+    if parsed is None:
+        return []
+    root_tag, locs = parsed
+
+    if root_tag == "sitemapindex":
+        # Child sitemaps are scheduled by the caller
+        return locs
+
+    is_media = _MEDIA_RE.search
+    # A list, not a set: urls.update() below hashes each URL once
+    locs = [url for url in locs if not is_media(url)]
+    if not locs and root_tag != "urlset":
+        # Unknown root and no <loc> to salvage
+        print(f"[WARN] Unknown sitemap type at {sitemap_url}; no <loc> found.", file=sys.stderr)
+
+    with lock:
+        urls.update(locs)
+    return []
+
+
+class _Progress:
+    """Sitemap walk counters, echoed to stderr at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, urls: Set[str]):
+        self.urls = urls
+        self.done = 0
+        self.pending = 0
+        self._next_report = time.monotonic() + PROGRESS_INTERVAL
+
+    def report(self) -> None:
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + PROGRESS_INTERVAL
+            print(
+                f"[INFO] Sitemaps: {self.done} done, {self.pending} pending | {len(self.urls)} URLs",
+                file=sys.stderr,
+            )
 
 
 def gather_all_urls_from_sitemap(
     sitemap_url: str,
-    visited: Set[str] = None,
+    visited: Set[_SitemapKey] = None,
+    max_workers: int = MAX_WORKERS,
 ) -> Set[str]:
     """
-    Recursively gather all <loc> URLs from a sitemap or sitemap index,
-    excluding media URLs.
+    Gather all <loc> URLs from a sitemap or sitemap index, excluding media URLs.
+
+    Child sitemaps are fetched concurrently on a thread pool. Workers schedule
+    the children of a sitemapindex themselves as soon as it is parsed, so the
+    pool never idles waiting on a driver loop; a pending-job counter under the
+    lock tells when the whole tree is done. Each worker streams its body
+    through the parser, so download and parsing already overlap per sitemap.
     """
     if visited is None:
         visited = set()
 
-    if sitemap_url in visited:
-        return set()
-    visited.add(sitemap_url)
+    urls = set()
+    lock = Lock()
+    finished = Event()
+    progress = _Progress(urls)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+        def schedule(locs: Iterable[str]) -> None:
+            # Caller holds `lock`
+            for loc in locs:
+                key = sitemap_key(loc)
+                if key not in visited:
+                    visited.add(key)
+                    progress.pending += 1
+                    pool.submit(run, loc)
 
+        def run(loc: str) -> None:
+            children = []
+            try:
+                children = expand_sitemap(loc, urls, visited, lock)
+            finally:
+                with lock:
+                    try:
+                        schedule(children)
+                    finally:
+                        # Always retire this job, or finished.wait() never returns
+                        progress.pending -= 1
+                        progress.done += 1
+                        progress.report()
+                        if progress.pending == 0:
+                            finished.set()
+
+        try:
+            with lock:
+                schedule([sitemap_url])
+            if progress.pending:
+                finished.wait()
+        finally:
+            CACHE.flush()
+
+    return urls
+
+
+async def _gather_async(
+    sitemap_url: str,
+    visited: Set[_SitemapKey],
+    urls: Set[str],
+    session: "aiohttp.ClientSession",
+    sem: asyncio.Semaphore,
+    progress: _Progress,
+) -> None:
+    """Expand one sitemap into the caller-owned `urls` set (single event loop, no lock)."""
+    key = sitemap_key(sitemap_url)
+    if key in visited:
+        return
+    visited.add(key)
+
+    progress.pending += 1
     try:
-        xml_bytes = fetch_bytes(sitemap_url)
+        await _expand_sitemap_async(sitemap_url, visited, urls, session, sem, progress)
+    finally:
+        progress.pending -= 1
+        progress.done += 1
+        progress.report()
+
+
+async def _read_sitemap_async(
+    sitemap_url: str,
+    visited: Set[_SitemapKey],
+    session: "aiohttp.ClientSession",
+    sem: asyncio.Semaphore,
+    fast: bool = True,
+) -> Optional[Tuple[str, List[str]]]:
+    """Async twin of _read_sitemap()."""
+    cache_headers = CACHE.conditional_headers(sitemap_url)
+    writer = None
+    try:
+        async with sem, session.get(sitemap_url, headers=cache_headers) as resp:
+            # A fallback re-read has already been claimed
+            if fast and not _claim_final_url(sitemap_url, str(resp.url), visited):
+                return None
+            not_modified = resp.status == 304 and bool(cache_headers)
+            if not not_modified:
+                resp.raise_for_status()
+                writer = CACHE.writer(sitemap_url, resp.headers)
+            try:
+                parser = SitemapPullParser(fast)
+                if not_modified:
+                    # Unchanged since the last run: replay the cached body
+                    with CACHE.open_body(sitemap_url) as body:
+                        for chunk in iter(functools.partial(body.read, READ_BUFFER_SIZE), b""):
+                            parser.feed(chunk)
+                else:
+                    async for chunk in resp.content.iter_any():
+                        if writer is not None:
+                            writer.write(chunk)
+                        parser.feed(chunk)
+                parsed = parser.close()
+            except _RegexFallback:
+                raise
+            except Exception as e:
+                print(f"[WARN] Failed to parse XML from {sitemap_url}: {e}", file=sys.stderr)
+                return None
+        if writer is not None:
+            writer.commit()
+        return parsed
+    except _RegexFallback:
+        raise
     except Exception as e:
         print(f"[WARN] Failed to fetch {sitemap_url}: {e}", file=sys.stderr)
-        return set()
+        return None
+    finally:
+        if writer is not None:
+            writer.discard()
 
+
+async def _expand_sitemap_async(
+    sitemap_url: str,
+    visited: Set[_SitemapKey],
+    urls: Set[str],
+    session: "aiohttp.ClientSession",
+    sem: asyncio.Semaphore,
+    progress: _Progress,
+) -> None:
+    """Fetch and parse one sitemap; page URLs go into `urls`, child sitemaps are walked concurrently."""
     try:
-        root = parse_sitemap_xml(xml_bytes)
-    except Exception as e:
-        print(f"[WARN] Failed to parse XML from {sitemap_url}: {e}", file=sys.stderr)
-        return set()
+        parsed = await _read_sitemap_async(sitemap_url, visited, session, sem)
+    except _RegexFallback:
+        # Markup the regex can't be trusted with: fetch again for the XML parser
+        parsed = await _read_sitemap_async(sitemap_url, visited, session, sem, fast=False)
+    if parsed is None:
+        return
+    root_tag, locs = parsed
 
-    urls = set()
+    if root_tag == "sitemapindex":
+        # Fan out to all child sitemaps at once; the semaphore bounds inflight requests
+        await asyncio.gather(*[_gather_async(loc, visited, urls, session, sem, progress) for loc in locs])
+        return
 
-    if is_sitemap_index(root):
-        # Recurse into child sitemaps
-        for loc in iter_loc_values(root):
-            urls |= gather_all_urls_from_sitemap(loc, visited)
-    elif is_urlset(root):
-        # Collect URLs
-        urls |= {url for url in iter_loc_values(root) if not is_media_url(url)}
-    else:
-        # Unknown root — try to collect any <loc> anyway
-        locs = {url for url in iter_loc_values(root) if not is_media_url(url)}
-        if locs:
-            urls |= locs
-        else:
-            print(f"[WARN] Unknown sitemap type at {sitemap_url}; no <loc> found.", file=sys.stderr)
+    is_media = _MEDIA_RE.search
+    locs = [url for url in locs if not is_media(url)]
+    if not locs and root_tag != "urlset":
+        print(f"[WARN] Unknown sitemap type at {sitemap_url}; no <loc> found.", file=sys.stderr)
+
+    urls.update(locs)
+
+
+async def gather_all_urls_from_sitemap_async(
+    sitemap_url: str,
+    visited: Set[_SitemapKey] = None,
+    concurrency: int = ASYNC_CONCURRENCY,
+) -> Set[str]:
+    """
+    asyncio/aiohttp variant of gather_all_urls_from_sitemap(): the sitemap
+    tree is walked on a single event loop with up to `concurrency` requests
+    in flight.
+    """
+    if visited is None:
+        visited = set()
 
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=16)
+    timeout = aiohttp.ClientTimeout(sock_connect=DEFAULT_TIMEOUT, sock_read=DEFAULT_TIMEOUT)
+    urls = set()
+    try:
+        async with aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=timeout) as session:
+            await _gather_async(sitemap_url, visited, urls, session, asyncio.Semaphore(concurrency), _Progress(urls))
+    finally:
+        CACHE.flush()
     return urls
 
 
+def _sorted_member_mask(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Boolean mask over sorted `a` marking elements also present in sorted `b`."""
+    if len(b) == 0:
+        return np.zeros(len(a), dtype=bool)
+    idx = np.searchsorted(b, a)
+    np.minimum(idx, len(b) - 1, out=idx)
+    return b[idx] == a
+
+
 def compare_paths(
     urls_a: Set[str],
     urls_b: Set[str],
@@ -172,89 +1319,204 @@ def compare_paths(
     keep_trailing_slash: bool = False,
     respect_case: bool = False,
     include_query: bool = False,
-) -> Tuple[Set[str], Set[str], Set[str]]:
+    strict_parse: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Return (matches, only_in_a, only_in_b) on normalized path keys.
+    Return (matches, only_in_a, only_in_b) on normalized path keys, each as a
+    sorted array. Both sides are sorted unique arrays, so membership is a
+    binary-search merge over contiguous memory rather than hashing into
+    Python sets. (np.setdiff1d is avoided: it degrades to O(n*m) on object
+    arrays.)
     """
-    paths_a = {normalize_path(u, keep_trailing_slash, respect_case, include_query) for u in urls_a}
-    paths_b = {normalize_path(u, keep_trailing_slash, respect_case, include_query) for u in urls_b}
+    paths_a = normalize_paths(urls_a, keep_trailing_slash, respect_case, include_query, strict_parse)
+    paths_b = normalize_paths(urls_b, keep_trailing_slash, respect_case, include_query, strict_parse)
+
+    a_in_b = _sorted_member_mask(paths_a, paths_b)
+    b_in_a = _sorted_member_mask(paths_b, paths_a)
 
-    matches = paths_a & paths_b
-    only_in_a = paths_a - paths_b
-    only_in_b = paths_b - paths_a
+    matches = paths_a[a_in_b]
+    only_in_a = paths_a[~a_in_b]
+    only_in_b = paths_b[~b_in_a]
 
     return matches, only_in_a, only_in_b
 
 
+def sort_by_depth(paths: Iterable[str]) -> List[str]:
+    """Order paths shallow-first, then alphabetically."""
+    # Sort by path, then stable-sort by depth. Input from compare_paths() is
+    # already sorted, so the first pass is ~O(n).
+    paths = np.sort(np.array(list(paths), dtype=object), kind="stable")
+    depths = np.fromiter((p.count("/") for p in paths), dtype=np.int64, count=len(paths))
+    return paths[np.argsort(depths, kind="stable")].tolist()
+
+
+def all_rows_frame(
+    matches_list: List[str],
+    only_a_list: List[str],
+    only_b_list: List[str],
+    label_a: str,
+    label_b: str,
+) -> pd.DataFrame:
+    """Build the combined status/pathname/source table column by column."""
+    counts = [len(matches_list), len(only_a_list), len(only_b_list)]
+    return pd.DataFrame(
+        {
+            "status": np.repeat(["MATCH", "ONLY_IN_A", "ONLY_IN_B"], counts),
+            "pathname": matches_list + only_a_list + only_b_list,
+            "source": np.repeat(["both", label_a, label_b], counts),
+        }
+    )
+
+
 def write_excel_report(
-    matches: Set[str],
-    only_in_a: Set[str],
-    only_in_b: Set[str],
+    matches: Iterable[str],
+    only_in_a: Iterable[str],
+    only_in_b: Iterable[str],
     out_path: str,
     label_a: str,
     label_b: str,
 ):
     """
     Save results into an Excel workbook with helpful sheets.
+
+    Written straight through xlsxwriter in constant_memory mode: each row is
+    flushed to disk as soon as the next one starts, so memory stays flat no
+    matter how many paths the report holds.
     """
-    def sorted_list(s: Set[str]) -> List[str]:
-        return sorted(s, key=lambda x: (x.count("/"), x))  # group shallow paths first
+    matches_list = sort_by_depth(matches)
+    only_a_list = sort_by_depth(only_in_a)
+    only_b_list = sort_by_depth(only_in_b)
 
-    matches_list = sorted_list(matches)
-    only_a_list = sorted_list(only_in_a)
-    only_b_list = sorted_list(only_in_b)
+    # xlsxwriter silently drops rows past the limit; the All sheet is the largest
+    total = len(matches_list) + len(only_a_list) + len(only_b_list)
+    if total >= EXCEL_MAX_ROWS:
+        raise ValueError(
+            f"{total} paths do not fit in one Excel sheet (max {EXCEL_MAX_ROWS - 1} rows); "
+            "use --format csv or --format parquet"
+        )
+
+    workbook = xlsxwriter.Workbook(out_path, {"constant_memory": True, "use_zip64": True})
+    header = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
 
-    all_rows = []
-    all_rows += [{"status": "MATCH", "pathname": p, "source": "both"} for p in matches_list]
-    all_rows += [{"status": "ONLY_IN_A", "pathname": p, "source": label_a} for p in only_a_list]
-    all_rows += [{"status": "ONLY_IN_B", "pathname": p, "source": label_b} for p in only_b_list]
+    def add_sheet(name: str, columns: List[str]):
+        # constant_memory writes rows in order, so widths and the header go first
+        ws = workbook.add_worksheet(name)
+        ws.set_column(0, 0, 22)
+        ws.set_column(1, 1, 80)
+        ws.set_column(2, 2, 20)
+        for col, title in enumerate(columns):
+            ws.write_string(0, col, title, header)
+        return ws
 
-    with pd.ExcelWriter(out_path, engine="xlsxwriter") as writer:
+    try:
         # Overview
-        overview = pd.DataFrame(
-            [
-                {"Metric": "Total (A)", "Value": len(matches_list) + len(only_a_list)},
-                {"Metric": "Total (B)", "Value": len(matches_list) + len(only_b_list)},
-                {"Metric": "Matches", "Value": len(matches_list)},
-                {"Metric": f"Only in A ({label_a})", "Value": len(only_a_list)},
-                {"Metric": f"Only in B ({label_b})", "Value": len(only_b_list)},
-            ]
-        )
-        overview.to_excel(writer, sheet_name="Overview", index=False)
+        ws = add_sheet("Overview", ["Metric", "Value"])
+        overview = [
+            ("Total (A)", len(matches_list) + len(only_a_list)),
+            ("Total (B)", len(matches_list) + len(only_b_list)),
+            ("Matches", len(matches_list)),
+            (f"Only in A ({label_a})", len(only_a_list)),
+            (f"Only in B ({label_b})", len(only_b_list)),
+        ]
+        for row, (metric, value) in enumerate(overview, start=1):
+            ws.write_string(row, 0, metric)
+            ws.write_number(row, 1, value)
 
         # Detailed sheets
-        pd.DataFrame({"pathname": matches_list}).to_excel(writer, sheet_name="Matches", index=False)
-        pd.DataFrame({"pathname": only_a_list}).to_excel(writer, sheet_name="Only_in_A", index=False)
-        pd.DataFrame({"pathname": only_b_list}).to_excel(writer, sheet_name="Only_in_B", index=False)
-        pd.DataFrame(all_rows)[["status", "pathname", "source"]].to_excel(writer, sheet_name="All", index=False)
+        for sheet, paths in (("Matches", matches_list), ("Only_in_A", only_a_list), ("Only_in_B", only_b_list)):
+            ws = add_sheet(sheet, ["pathname"])
+            for row, path in enumerate(paths, start=1):
+                ws.write_string(row, 0, path)
 
-        # Autofit columns a bit
-        for sheet in ["Overview", "Matches", "Only_in_A", "Only_in_B", "All"]:
-            ws = writer.sheets[sheet]
-            ws.set_column(0, 0, 22)
-            ws.set_column(1, 1, 80)
-            ws.set_column(2, 2, 20)
+        # Combined table, streamed section by section
+        ws = add_sheet("All", ["status", "pathname", "source"])
+        row = 1
+        for status, paths, source in (
+            ("MATCH", matches_list, "both"),
+            ("ONLY_IN_A", only_a_list, label_a),
+            ("ONLY_IN_B", only_b_list, label_b),
+        ):
+            for path in paths:
+                ws.write_string(row, 0, status)
+                ws.write_string(row, 1, path)
+                ws.write_string(row, 2, source)
+                row += 1
+    finally:
+        workbook.close()
+
+
+def write_table_report(
+    matches: Iterable[str],
+    only_in_a: Iterable[str],
+    only_in_b: Iterable[str],
+    out_path: str,
+    label_a: str,
+    label_b: str,
+    fmt: str,
+):
+    """
+    Save the combined status/pathname/source table as a single Parquet or CSV
+    file. Much faster than Excel for large diffs; the summary is on stdout.
+    """
+    frame = all_rows_frame(sort_by_depth(matches), sort_by_depth(only_in_a), sort_by_depth(only_in_b), label_a, label_b)
+    if fmt == "parquet":
+        frame.to_parquet(out_path, index=False, compression="zstd")
+    else:
+        frame.to_csv(out_path, index=False)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Compare sitemap pathnames between two websites.")
     parser.add_argument("sitemap_a", help="Sitemap URL for OLD site (parent or index sitemap).")
     parser.add_argument("sitemap_b", help="Sitemap URL for NEW site (parent or index sitemap).")
-    parser.add_argument("-o", "--out", default="sitemap_comparison.xlsx", help="Output Excel file path.")
+    parser.add_argument("-o", "--out", help="Output file path (default: sitemap_comparison.<format>).")
+    parser.add_argument("--format", choices=["xlsx", "parquet", "csv"], default="xlsx", help="Report format. parquet/csv hold the combined table only.")
     parser.add_argument("--label-a", default="OLD", help="Label for site A in the report.")
     parser.add_argument("--label-b", default="NEW", help="Label for site B in the report.")
     parser.add_argument("--keep-trailing-slash", action="store_true", help="Keep trailing slash during normalization.")
     parser.add_argument("--respect-case", action="store_true", help="Do not lowercase paths during normalization.")
     parser.add_argument("--include-query", action="store_true", help="Include querystring in comparison key.")
+    parser.add_argument("--strict-parse", action="store_true", help="Split URLs with urlparse (slower, handles unusual URLs).")
+    parser.add_argument("--no-cache", action="store_true", help=f"Do not read or write the sitemap cache in {CACHE_DIR}.")
+    parser.add_argument("--http2", action="store_true", help="Fetch over HTTP/2 with httpx, multiplexing requests per host.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Fetch sitemaps with asyncio/aiohttp instead of threads.")
 
     args = parser.parse_args()
 
+    if args.format == "xlsx" and xlsxwriter is None:
+        parser.error("--format xlsx requires xlsxwriter. Install via: pip install xlsxwriter")
+    if args.format == "parquet" and not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        # Checked up front: pandas only imports the engine when writing, after the crawl
+        parser.error("--format parquet requires pyarrow or fastparquet. Install via: pip install pyarrow")
+
+    if args.no_cache:
+        CACHE.enabled = False
+
+    if args.http2:
+        if args.use_async:
+            parser.error("--http2 applies to the threaded fetcher and cannot be combined with --async")
+        try:
+            if httpx is None:
+                raise ImportError("httpx is not installed")
+            enable_http2()
+        except ImportError as e:
+            parser.error(f"--http2 requires httpx[http2] ({e}). Install via: pip install 'httpx[http2]'")
+
+    if args.use_async:
+        if aiohttp is None:
+            parser.error("--async requires aiohttp. Install via: pip install aiohttp")
+
+        def gather(url: str) -> Set[str]:
+            return asyncio.run(gather_all_urls_from_sitemap_async(url))
+    else:
+        gather = gather_all_urls_from_sitemap
+
     print(f"[INFO] Fetching and expanding sitemap A: {args.sitemap_a}")
-    urls_a = gather_all_urls_from_sitemap(args.sitemap_a)
+    urls_a = gather(args.sitemap_a)
     print(f"[INFO] Found {len(urls_a)} URLs in A")
 
     print(f"[INFO] Fetching and expanding sitemap B: {args.sitemap_b}")
-    urls_b = gather_all_urls_from_sitemap(args.sitemap_b)
+    urls_b = gather(args.sitemap_b)
     print(f"[INFO] Found {len(urls_b)} URLs in B")
 
     print("[INFO] Comparing normalized pathnames...")
@@ -264,19 +1526,23 @@ def main():
         keep_trailing_slash=args.keep_trailing_slash,
         respect_case=args.respect_case,
         include_query=args.include_query,
+        strict_parse=args.strict_parse,
     )
 
     print(f"[RESULT] Matches: {len(matches)} | Only in A: {len(only_in_a)} | Only in B: {len(only_in_b)}")
 
-    print(f"[INFO] Writing Excel report → {args.out}")
-    write_excel_report(matches, only_in_a, only_in_b, args.out, args.label_a, args.label_b)
+    out_path = args.out or f"sitemap_comparison.{args.format}"
+    if args.format == "xlsx":
+        print(f"[INFO] Writing Excel report → {out_path}")
+        try:
+            write_excel_report(matches, only_in_a, only_in_b, out_path, args.label_a, args.label_b)
+        except ValueError as e:
+            sys.exit(f"[ERROR] {e}")
+    else:
+        print(f"[INFO] Writing {args.format} report → {out_path}")
+        write_table_report(matches, only_in_a, only_in_b, out_path, args.label_a, args.label_b, args.format)
     print("[DONE] Report generated.")
 
 
 if __name__ == "__main__":
-    # Fail-fast helpful message if pandas/xlsxwriter missing
-    try:
-        import xlsxwriter  # noqa: F401
-    except Exception:
-        print("[WARN] The 'xlsxwriter' engine is recommended for best Excel output. Install via: pip install xlsxwriter", file=sys.stderr)
     main()
@@ -0,0 +1,127 @@
+import errno
+import functools
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import compare_sitemaps as cs
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+SITEMAP = f"<urlset {NS}>" + "".join(f"<url><loc>https://a.com/p{i}</loc></url>" for i in range(2000)) + "</urlset>"
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    # Answers If-Modified-Since with 304; status codes are recorded per path
+    def log_request(self, code="-", size="-"):
+        self.server.statuses.append((self.path, int(code)))
+
+
+class CacheTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.site = tempfile.mkdtemp()
+        for name, body in (("s.xml", SITEMAP), ("bad.xml", "<urlset><url><loc>x</url>")):
+            with open(os.path.join(cls.site, name), "w", encoding="utf-8") as f:
+                f.write(body)
+        handler = functools.partial(_Handler, directory=cls.site)
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        cls.server.statuses = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.site)
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = mock.patch.object(cs, "CACHE", cs.SitemapCache(self.cache_dir))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server.statuses.clear()
+
+    def read(self, name):
+        with cs.open_sitemap(self.base + name) as (stream, _):
+            return stream.read()
+
+    def leftover_tmp_files(self):
+        return [f for f in os.listdir(self.cache_dir) if f.endswith(".tmp")]
+
+    def test_304_replays_cached_body(self):
+        first = self.read("s.xml")
+        second = self.read("s.xml")
+        self.assertEqual(first, SITEMAP.encode("utf-8"))
+        self.assertEqual(second, first)
+        self.assertEqual([code for _, code in self.server.statuses], [200, 304])
+
+    def test_commits_only_at_eof(self):
+        with cs.open_sitemap(self.base + "s.xml") as (stream, _):
+            stream.read(100)
+        self.assertEqual(self.cache.conditional_headers(self.base + "s.xml"), {})
+        self.assertEqual(self.leftover_tmp_files(), [])
+
+    def test_discards_body_on_parse_error(self):
+        with mock.patch("sys.stderr"):
+            urls = cs.gather_all_urls_from_sitemap(self.base + "bad.xml")
+        self.assertEqual(urls, set())
+        self.assertEqual(self.cache.conditional_headers(self.base + "bad.xml"), {})
+        self.assertEqual(self.leftover_tmp_files(), [])
+
+    def test_disk_error_keeps_parsed_urls(self):
+        def no_space(*args):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        for gather in (cs.gather_all_urls_from_sitemap, self.gather_async):
+            self.cache.enabled = True
+            with self.subTest(gather=gather.__name__), mock.patch.object(cs.os, "replace", no_space), mock.patch("sys.stderr"):
+                urls = gather(self.base + "s.xml")
+            self.assertEqual(len(urls), 2000)
+            self.assertFalse(self.cache.enabled)
+
+    def gather_async(self, url):
+        if cs.aiohttp is None:
+            self.skipTest("aiohttp is not installed")
+        return cs.asyncio.run(cs.gather_all_urls_from_sitemap_async(url))
+
+    def other_entry(self):
+        # A second cache instance over the same directory, as in a concurrent run
+        other = cs.SitemapCache(self.cache_dir)
+        path = os.path.join(self.cache_dir, "other.gz")
+        open(path, "wb").close()
+        other._store("http://other/x.xml", {"etag": "x", "last_modified": None, "path": path})
+        return other
+
+    def index_urls(self):
+        with open(os.path.join(self.cache_dir, "index.json"), encoding="utf-8") as f:
+            return sorted(json.load(f))
+
+    def test_flush_merges_concurrent_runs(self):
+        self.read("s.xml")
+        other = self.other_entry()
+        self.cache.flush()
+        other.flush()
+        self.assertEqual(self.index_urls(), sorted(["http://other/x.xml", self.base + "s.xml"]))
+
+    def test_flush_expires_unused_entries(self):
+        self.read("s.xml")
+        self.cache.flush()
+        body = self.cache._body_path(self.base + "s.xml")
+        self.assertTrue(os.path.exists(body))
+
+        with mock.patch.object(cs.time, "time", return_value=time.time() + cs.CACHE_MAX_AGE + 60):
+            self.other_entry().flush()
+        self.assertEqual(self.index_urls(), ["http://other/x.xml"])
+        self.assertFalse(os.path.exists(body))
+
+
+if __name__ == "__main__":
+    unittest.main()
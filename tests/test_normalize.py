@@ -0,0 +1,80 @@
+import itertools
+import random
+import unittest
+from unittest import mock
+
+import compare_sitemaps as cs
+
+# URL fragments glued together at random: schemes (with and without ;params
+# support), netlocs, params, queries, fragments and a few malformed pieces
+PARTS = [
+    "https://A.com", "http://b.org", "HTTP://c.io", "FTP:", "tel:", "x+y:", "a:", "1b:", ":",
+    "", "/", "//", "///", "/Foo", "/bar/", "/x.JPG", "?x=1", "?", "?a=/b/", "#f", "#",
+    ";p", ";jsessionid=AB", "/a;b", ";", "a?b:c", " ", "\t", "\r\n", "\n", "\x01", "h\tttp:",
+]
+# Only the per-URL and pandas paths see these; the Numba kernel is ASCII-only
+NON_ASCII = ["é", "/ΟΔΟΣ", "ΑΣ", "/İstanbul"]
+FLAGS = list(itertools.product([False, True], repeat=3))
+
+
+def fuzz_urls(count=20_000, seed=3, parts=PARTS):
+    rng = random.Random(seed)
+    return sorted({"".join(rng.choice(parts) for _ in range(rng.randint(1, 6))) for _ in range(count)})
+
+
+class NormalizePathTests(unittest.TestCase):
+    def test_drops_params_like_urlparse(self):
+        for strict in (False, True):
+            self.assertEqual(cs.normalize_path("https://x.com/page;jsessionid=ABC", strict_parse=strict), "/page")
+            self.assertEqual(cs.normalize_path("https://x.com/a;b/c;d?q=1", include_query=True, strict_parse=strict), "/a;b/c?q=1")
+
+    def test_drops_tabs_and_newlines_like_urlsplit(self):
+        for strict in (False, True):
+            self.assertEqual(cs.normalize_path("https://a.com/x\tY", strict_parse=strict), "/xy")
+            self.assertEqual(cs.normalize_path(" \nhttps://a.com/\r\nx", strict_parse=strict), "/x")
+
+    def test_scanner_matches_urlparse(self):
+        urls = fuzz_urls(parts=PARTS + NON_ASCII)
+        for flags in FLAGS:
+            for url in urls:
+                self.assertEqual(cs.normalize_path(url, *flags), cs.normalize_path(url, *flags, True), (url, flags))
+
+
+class MediaUrlTests(unittest.TestCase):
+    def test_extension_before_params_query_or_fragment(self):
+        for url in ("https://a.com/img/x.jpg", "https://a.com/img/x.JPG;jsessionid=1", "https://a.com/v.mp4?t=1", "https://a.com/a.png#f"):
+            self.assertTrue(cs.is_media_url(url), url)
+        for url in ("https://a.com/x.jpg/page", "https://a.com/x.jpg;p/page", "https://a.com/page?img=x.jpg", "https://a.com/x.jpgs"):
+            self.assertFalse(cs.is_media_url(url), url)
+
+
+class NormalizePathsTests(unittest.TestCase):
+    def test_keys_do_not_depend_on_input_size(self):
+        big = [f"https://old.gr/p{i}" for i in range(6000)] + ["https://old.gr/ΟΔΟΣ"]
+        with mock.patch.object(cs, "numba", None):
+            matches, _, _ = cs.compare_paths(big, ["https://new.gr/ΟΔΟΣ"])
+        self.assertEqual(matches.tolist(), ["/οδος"])
+
+    def assert_matches_urlparse(self, urls):
+        for flags in FLAGS:
+            expected = [cs.normalize_path(url, *flags, True) for url in urls]
+            self.assertEqual(cs.normalize_paths(urls, *flags).tolist(), sorted(set(expected)), flags)
+
+    def test_pandas_matches_urlparse(self):
+        with mock.patch.object(cs, "numba", None), mock.patch.object(cs, "VECTORIZE_MIN_URLS", 0):
+            self.assert_matches_urlparse(fuzz_urls(parts=PARTS + NON_ASCII))
+
+    @unittest.skipIf(cs.numba is None, "numba is not installed")
+    def test_numba_matches_urlparse(self):
+        with mock.patch.object(cs, "VECTORIZE_MIN_URLS", 0), mock.patch.object(cs, "NUMBA_MIN_URLS", 0):
+            self.assert_matches_urlparse(fuzz_urls())
+
+    @unittest.skipIf(cs.numba is None, "numba is not installed")
+    def test_numba_takes_long_urls(self):
+        urls = fuzz_urls(2000) + ["https://a.com/" + "Ab/" * 2000 + ";p?q#f"]
+        expected = sorted({cs.normalize_path(url, strict_parse=True) for url in urls})
+        self.assertEqual(cs._normalize_paths_numba(urls, False, False, False).tolist(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
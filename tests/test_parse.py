@@ -0,0 +1,134 @@
+import gzip
+import io
+import unittest
+import xml.etree.ElementTree
+from unittest import mock
+
+import compare_sitemaps as cs
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+IMAGE_NS = 'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+
+# Expected <loc> values per document; every parser backend must agree
+DOCS = {
+    "plain": (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}>'
+        "<url><loc>https://a.com/x?a=1&amp;b=2&#38;c=&#x26;d</loc></url>"
+        "<url><loc>\n  https://a.com/y  \n</loc></url>"
+        "<url><loc><![CDATA[https://a.com/z?q=<1>&x]]></loc></url></urlset>",
+        ["https://a.com/x?a=1&b=2&c=&d", "https://a.com/y", "https://a.com/z?q=<1>&x"],
+    ),
+    "index": (
+        f"<sitemapindex {NS}>" + "".join(f"<sitemap><loc>https://a.com/s{i}.xml</loc></sitemap>" for i in range(50)) + "</sitemapindex>",
+        [f"https://a.com/s{i}.xml" for i in range(50)],
+    ),
+    "prefixed": (
+        '<sm:urlset xmlns:sm="http://www.sitemaps.org/schemas/sitemap/0.9"><sm:url><sm:loc>https://a.com/p</sm:loc></sm:url></sm:urlset>',
+        ["https://a.com/p"],
+    ),
+    "latin1": (
+        '<?xml version="1.0" encoding="ISO-8859-1"?><urlset><url><loc>https://a.com/\xe9</loc></url></urlset>',
+        ["https://a.com/\xe9"],
+    ),
+    "comments": (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}><!-- <url><loc>https://a.com/old</loc></url> -->'
+        "<url><loc>https://a.com/new</loc></url></urlset>\n<!-- generated by a sitemap plugin -->",
+        ["https://a.com/new"],
+    ),
+    "loc with space": (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}><url><loc >https://a.com/sp</loc></url>'
+        "<url><loc>https://a.com/ok</loc></url></urlset>",
+        ["https://a.com/sp", "https://a.com/ok"],
+    ),
+    "loc closed with newline": (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}><url><loc>https://a.com/1</loc></url>'
+        "<url><loc>https://a.com/2</loc\n></url></urlset>",
+        ["https://a.com/1", "https://a.com/2"],
+    ),
+    "nested image": (
+        f'<?xml version="1.0" encoding="ISO-8859-1"?><urlset {NS} {IMAGE_NS}><url><loc>https://a.com/y</loc>'
+        "<image:image><image:loc>https://a.com/i</image:loc></image:image></url></urlset>",
+        ["https://a.com/y"],
+    ),
+    "comment in loc": (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}><url><loc>https://a.com/p<!-- x -->q</loc></url></urlset>',
+        ["https://a.com/pq"],
+    ),
+    "comment in latin1 loc": (
+        '<?xml version="1.0" encoding="ISO-8859-1"?><urlset><url><loc> https://a.com/<!-- x -->\xe9 </loc></url></urlset>',
+        ["https://a.com/\xe9"],
+    ),
+}
+
+
+def encode(doc):
+    return doc.encode("latin-1" if "ISO-8859-1" in doc else "utf-8")
+
+
+def parse_stream(body, fast=True):
+    return cs.parse_sitemap_stream(io.BufferedReader(io.BytesIO(body)), fast)
+
+
+def parse_chunks(data, step, fast=True):
+    parser = cs.SitemapPullParser(fast)
+    for i in range(0, len(data), step):
+        parser.feed(data[i:i + step])
+    return parser.close()
+
+
+def with_fallback(parse, *args):
+    # What the walkers do: re-read with the XML parser when the regex bails out
+    try:
+        return parse(*args)
+    except cs._RegexFallback:
+        return parse(*args, fast=False)
+
+
+class ParseTests(unittest.TestCase):
+    def check_docs(self):
+        for name, (doc, expected) in DOCS.items():
+            body = encode(doc)
+            root_tag = "sitemapindex" if name == "index" else "urlset"
+            self.assertEqual(with_fallback(parse_stream, body), (root_tag, expected), name)
+            for data in (body, gzip.compress(body)):
+                for step in (1, 7, 4096):
+                    self.assertEqual(with_fallback(parse_chunks, data, step), (root_tag, expected), (name, step))
+
+    def test_regex_skips_comments(self):
+        body = encode(DOCS["comments"][0])
+        self.assertEqual(parse_stream(body), ("urlset", DOCS["comments"][1]))
+        for step in (1, 3, 5):
+            self.assertEqual(parse_chunks(body, step), ("urlset", DOCS["comments"][1]), step)
+
+    def test_regex_bails_out_on_unhandled_markup(self):
+        for doc in (
+            DOCS["loc with space"][0],
+            f"<urlset {NS}><url><loc/></url><url><loc>https://a.com/x</loc></url></urlset>",
+            f"<urlset {NS}><!-- <loc>",
+            # </loc> with whitespace after the last plain </loc>
+            f"<urlset {NS}><url><loc>https://a.com/1</loc></url><url><loc>https://a.com/2</loc\n></url></urlset>",
+            # Truncated mid-<loc>, and after a complete <url>
+            f"<urlset {NS}><url><loc>https://a.com/1</loc></url><url><loc>https://a.",
+            f"<urlset {NS}><url><loc>https://a.com/1</loc></url>",
+        ):
+            with self.assertRaises(cs._RegexFallback):
+                parse_stream(doc.encode("utf-8"))
+            with self.assertRaises(cs._RegexFallback):
+                parse_chunks(doc.encode("utf-8"), 2)
+
+    def test_truncated_body_is_a_parse_error(self):
+        body = f"<urlset {NS}><url><loc>https://a.com/1</loc></url><url><loc>https://a.".encode("utf-8")
+        with self.assertRaises(SyntaxError):
+            with_fallback(parse_stream, body)
+
+    @unittest.skipUnless(cs.HAVE_LXML, "lxml is not installed")
+    def test_lxml(self):
+        self.check_docs()
+
+    def test_elementtree(self):
+        with mock.patch.object(cs, "HAVE_LXML", False), mock.patch.object(cs, "etree", xml.etree.ElementTree):
+            self.check_docs()
+
+
+if __name__ == "__main__":
+    unittest.main()